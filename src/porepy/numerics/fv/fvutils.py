@@ -2,9 +2,16 @@
 Various FV specific utility functions.
 """
 from __future__ import division
+import sys
 import numpy as np
 import scipy.sparse as sps
 
+try:
+    import numba
+except ImportError:
+    # Numba is optional; the block inverters will fall back on cython or python
+    pass
+
 import porepy as pp
 from porepy.utils import matrix_compression, mcolon
 from porepy.grids.grid_bucket import GridBucket
@@ -318,8 +325,12 @@ def invert_diagonal_blocks(mat, s, method=None):
 
     def invert_diagonal_blocks_numba(a, size):
         """
-        Invert block diagonal matrix by invoking numba acceleration of a simple
-        for-loop based algorithm.
+        Invert block diagonal matrix by invoking numba acceleration.
+
+        The blocks are grouped according to their size. For each size, the
+        blocks are gathered into a stacked dense array by a parallel numba kernel
+        (compiled once, and cached on disk), and inverted by a single batched
+        call to np.linalg.inv.
 
         This approach should be more efficient than the related method
         invert_diagonal_blocks_python for larger problems.
@@ -333,87 +344,34 @@ def invert_diagonal_blocks(mat, s, method=None):
         -------
         ia: inverse of a
         """
-        try:
-            import numba
-        except:
+        if "numba" not in sys.modules:
             raise ImportError("Numba not available on the system")
 
-        # Sort matrix storage before pulling indices and data
-        a.sorted_indices()
+        size = np.asarray(size)
         ptr = a.indptr
         indices = a.indices
-        dat = a.data
+        dat = a.data.astype(np.float64, copy=False)
 
-        # Just in time compilation
-        @numba.jit("f8[:](i4[:],i4[:],f8[:],i8[:])", nopython=True, nogil=False)
-        def inv_python(indptr, ind, data, sz):
-            """
-            Invert block matrices by explicitly forming local matrices. The code
-            in itself is not efficient, but it is hopefully well suited for
-            speeding up with numba.
-
-            It may be possible to restruct the code to further help numba,
-            this has not been investigated.
-
-            The computation can easily be parallelized, consider this later.
-            """
-
-            # Index of where the rows start for each block.
-            # block_row_starts_ind = np.hstack((np.array([0]),
-            #                                   np.cumsum(sz[:-1])))
-            block_row_starts_ind = np.zeros(sz.size, dtype=np.int32)
-            block_row_starts_ind[1:] = np.cumsum(sz[:-1])
-
-            # Number of columns per row. Will change from one column to the
-            # next
-            num_cols_per_row = indptr[1:] - indptr[0:-1]
-            # Index to where the columns start for each row (NOT blocks)
-            # row_cols_start_ind = np.hstack((np.zeros(1),
-            #                                 np.cumsum(num_cols_per_row)))
-            row_cols_start_ind = np.zeros(num_cols_per_row.size + 1, dtype=np.int32)
-            row_cols_start_ind[1:] = np.cumsum(num_cols_per_row)
-
-            # Index to where the (full) data starts. Needed, since the
-            # inverse matrix will generally be full
-            # full_block_starts_ind = np.hstack((np.array([0]),
-            #                                    np.cumsum(np.square(sz))))
-            full_block_starts_ind = np.zeros(sz.size + 1, dtype=np.int32)
-            full_block_starts_ind[1:] = np.cumsum(np.square(sz))
-            # Structure to store the solution
-            inv_vals = np.zeros(np.sum(np.square(sz)))
-
-            # Loop over all blocks
-            for iter1 in range(sz.size):
-                n = sz[iter1]
-                loc_mat = np.zeros((n, n))
-                # Fill in non-zero elements in local matrix
-                for iter2 in range(n):  # Local rows
-                    global_row = block_row_starts_ind[iter1] + iter2
-                    data_counter = row_cols_start_ind[global_row]
-
-                    # Loop over local columns. Getting the number of columns
-                    #  for each row is a bit involved
-                    for _ in range(
-                        num_cols_per_row[iter2 + block_row_starts_ind[iter1]]
-                    ):
-                        loc_col = ind[data_counter] - block_row_starts_ind[iter1]
-                        loc_mat[iter2, loc_col] = data[data_counter]
-                        data_counter += 1
-
-                # Compute inverse. np.linalg.inv is supported by numba (May
-                # 2016), it is not clear if this is the best option. To be
-                # revised
-                inv_mat = np.ravel(np.linalg.inv(loc_mat))
-
-                loc_ind = np.arange(
-                    full_block_starts_ind[iter1], full_block_starts_ind[iter1 + 1]
-                )
-                inv_vals[loc_ind] = inv_mat
-                # Update fields
-            return inv_vals
+        # Index of the first row of each block
+        block_row_starts = np.zeros(size.size, dtype=ptr.dtype)
+        block_row_starts[1:] = np.cumsum(size[:-1])
+        # Index of where the (full) data of each block starts in the inverse
+        full_block_starts = np.zeros(size.size, dtype=np.int64)
+        full_block_starts[1:] = np.cumsum(np.square(size[:-1]))
 
-        v = inv_python(ptr, indices, dat, size)
-        return v
+        inv_vals = np.zeros(np.sum(np.square(size)))
+
+        for n in np.unique(size):
+            block_ind = np.where(size == n)[0].astype(ptr.dtype)
+            loc_mats = _gather_diagonal_blocks_numba(
+                ptr, indices, dat, block_row_starts, block_ind, n
+            )
+            # Batched inversion of all blocks of this size
+            inv_mats = np.linalg.inv(loc_mats)
+            loc_ind = full_block_starts[block_ind].reshape((-1, 1)) + np.arange(n * n)
+            inv_vals[loc_ind.ravel()] = inv_mats.ravel()
+
+        return inv_vals
 
     # Variable to check if we have tried and failed with numba
     try_cython = False
@@ -436,6 +394,39 @@ def invert_diagonal_blocks(mat, s, method=None):
     return ia
 
 
+if "numba" in sys.modules:
+
+    @numba.njit(cache=True, parallel=True)
+    def _gather_diagonal_blocks_numba(indptr, ind, data, block_row_starts, block_ind, n):
+        """
+        Extract diagonal blocks of equal size from a csr matrix into a stacked
+        dense array.
+
+        The kernel is compiled on first use and cached on disk. Index arrays can
+        be either int32 or int64 (as used by scipy for large matrices), each
+        gives a separately compiled version.
+
+        Parameters:
+            indptr, ind, data: csr storage of the block diagonal matrix.
+            block_row_starts (np.ndarray): First row of each block.
+            block_ind (np.ndarray): Index of the blocks to be extracted, all of
+                size n.
+            n (int): Size of the blocks.
+
+        Returns:
+            np.ndarray, size block_ind.size x n x n: The extracted blocks.
+
+        """
+        loc_mats = np.zeros((block_ind.size, n, n))
+        for bi in numba.prange(block_ind.size):
+            start = block_row_starts[block_ind[bi]]
+            for loc_row in range(n):
+                row = start + loc_row
+                for di in range(indptr[row], indptr[row + 1]):
+                    loc_mats[bi, loc_row, ind[di] - start] = data[di]
+        return loc_mats
+
+
 def block_diag_matrix(vals, sz):
     """
     Construct block diagonal matrix based on matrix elements and block sizes.
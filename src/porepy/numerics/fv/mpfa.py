@@ -3,6 +3,7 @@ Implementation of the multi-point flux approximation O-method.
 
 """
 from __future__ import division
+import multiprocessing
 import warnings
 import numpy as np
 import scipy.sparse as sps
@@ -39,6 +40,13 @@ class Mpfa(FVElliptic):
         get_tensor : SecondOrderTensor. Permeability defined cell-wise.
         get_bc : boundary conditions
         get_robin_weight : float. Weight for pressure in Robin condition
+
+        In addition, the following optional fields in data are used:
+        mpfa_eta : Location of pressure continuity point, see mpfa().
+        mpfa_max_memory : Threshold for peak memory, see mpfa().
+        mpfa_n_workers : Number of processes used in the discretization, see
+            mpfa().
+
         Parameters
         ----------
         g : grid, or a subclass, with geometry fields computed.
@@ -51,16 +59,35 @@ class Mpfa(FVElliptic):
         a = param.aperture
 
         eta = data.get("mpfa_eta", None)
+        max_memory = data.get("mpfa_max_memory", None)
+        n_workers = data.get("mpfa_n_workers", None)
 
         trm, bound_flux, bp_cell, bp_face = self.mpfa(
-            g, k, bnd, eta=eta, apertures=a
+            g,
+            k,
+            bnd,
+            eta=eta,
+            apertures=a,
+            max_memory=max_memory,
+            n_workers=n_workers,
         )
         data[self._key() + "flux"] = trm
         data[self._key() + "bound_flux"] = bound_flux
         data[self._key() + "bound_pressure_cell"] = bp_cell
         data[self._key() + "bound_pressure_face"] = bp_face
 
-    def mpfa(self, g, k, bnd, eta=None, inverter=None, apertures=None, max_memory=None, **kwargs):
+    def mpfa(
+        self,
+        g,
+        k,
+        bnd,
+        eta=None,
+        inverter=None,
+        apertures=None,
+        max_memory=None,
+        n_workers=None,
+        **kwargs
+    ):
         """
         Discretize the scalar elliptic equation by the multi-point flux
         approximation method.
@@ -91,7 +118,14 @@ class Mpfa(FVElliptic):
             max_memory (double): Threshold for peak memory during discretization.
                 If the **estimated** memory need is larger than the provided
                 threshold, the discretization will be split into an appropriate
-                number of sub-calculations, using mpfa_partial().
+                number of sub-calculations, using partial_discr().
+            n_workers (int, optional): Number of processes used for the
+                discretization. If larger than 1, the grid is partitioned, and the
+                sub-discretizations (see partial_discr()) are computed in a process
+                pool. When combined with max_memory, the number of partitions is
+                chosen so that the estimated memory of n_workers simultaneous
+                sub-discretizations does not exceed max_memory. Defaults to None,
+                that is, a serial discretization.
 
         Returns:
             scipy.sparse.csr_matrix (shape num_faces, num_cells): flux
@@ -139,7 +173,7 @@ class Mpfa(FVElliptic):
             bp = bp_cell * x + bp_face * bound_vals
         """
 
-        if max_memory is None:
+        if max_memory is None and (n_workers is None or n_workers < 2):
             # For the moment nothing to do here, just call main mpfa method for the
             # entire grid.
             # TODO: We may want to estimate the memory need, and give a warning if
@@ -153,28 +187,28 @@ class Mpfa(FVElliptic):
                 apertures=apertures,
             )
         else:
-            # Estimate number of partitions necessary based on prescribed memory
-            # usage
-            peak_mem = self._estimate_peak_memory(g)
-            num_part = np.ceil(peak_mem / max_memory)
+            if n_workers is None:
+                n_workers = 1
+
+            if max_memory is None:
+                # No memory constraint, use one partition per worker
+                num_part = n_workers
+            else:
+                # Estimate number of partitions necessary based on prescribed
+                # memory usage. Each of the workers will hold one sub-problem in
+                # memory at the same time, thus the estimate is scaled with the
+                # number of workers.
+                peak_mem = self._estimate_peak_memory(g)
+                num_part = max(np.ceil(n_workers * peak_mem / max_memory), n_workers)
 
             # Let partitioning module apply the best available method
             part = pp.partition.partition(g, num_part)
 
-            # Empty fields for flux and bound_flux. Will be expanded as we go.
-            # Implementation note: It should be relatively straightforward to
-            # estimate the memory need of flux (face_nodes -> node_cells ->
-            # unique).
-            flux = sps.csr_matrix(g.num_faces, g.num_cells)
-            bound_flux = sps.csr_matrix(g.num_faces, g.num_faces)
-            bound_pressure_cell = sps.csr_matrix(g.num_faces, g.num_cells)
-            bound_pressure_face = sps.csr_matrix(g.num_faces, g.num_faces)
-
             cn = g.cell_nodes()
 
-            face_covered = np.zeros(g.num_faces, dtype=np.bool)
-
-            for p in range(part.max()):
+            # Arguments for the local discretizations, one per partition.
+            sub_problems = []
+            for p in np.unique(part):
                 # Cells in this partitioning
                 cell_ind = np.argwhere(part == p).ravel("F")
                 # To discretize with as little overlap as possible, we use the
@@ -184,23 +218,29 @@ class Mpfa(FVElliptic):
                 active_cells[cell_ind] = 1
                 active_nodes = np.squeeze(np.where((cn * active_cells) > 0))
 
-                # Perform local discretization.
-                loc_flux, loc_bound_flux, loc_bp_cell, loc_bp_face, loc_faces = self.partial_discr(
-                    g, k, bnd, eta=eta, inverter=inverter, nodes=active_nodes
+                sub_problems.append(
+                    (self.keyword, g, k, bnd, eta, inverter, apertures, active_nodes)
                 )
 
-                # Eliminate contribution from faces already covered
-                loc_flux[face_covered, :] *= 0
-                loc_bound_flux[face_covered, :] *= 0
-                loc_bp_cell[face_covered, :] *= 0
-                loc_bp_face[face_covered, :] *= 0
-
-                face_covered[loc_faces] = 1
-
-                flux += loc_flux
-                bound_flux += loc_bound_flux
-                bound_pressure_cell += loc_bp_cell
-                bound_pressure_face += loc_bp_face
+            if n_workers > 1:
+                pool = multiprocessing.Pool(min(n_workers, len(sub_problems)))
+                try:
+                    # imap preserves the ordering of the partitions, thus the
+                    # merge below is deterministic.
+                    partial_results = pool.imap(_partial_discr_worker, sub_problems)
+                    flux, bound_flux, bound_pressure_cell, bound_pressure_face = self._merge_partial_discr(
+                        g, partial_results
+                    )
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                # Use a generator, so that only one local discretization is held
+                # in memory at the time
+                partial_results = (_partial_discr_worker(a) for a in sub_problems)
+                flux, bound_flux, bound_pressure_cell, bound_pressure_face = self._merge_partial_discr(
+                    g, partial_results
+                )
 
         return flux, bound_flux, bound_pressure_cell, bound_pressure_face
 
@@ -279,6 +319,11 @@ class Mpfa(FVElliptic):
         loc_k = k.copy()
         loc_k.perm = loc_k.perm[::, ::, l2g_cells]
 
+        if apertures is not None:
+            loc_apertures = apertures[l2g_cells]
+        else:
+            loc_apertures = None
+
         glob_bound_face = g.get_all_boundary_faces()
 
         # Boundary conditions are slightly more complex. Find local faces
@@ -302,7 +347,7 @@ class Mpfa(FVElliptic):
 
         # Discretization of sub-problem
         flux_loc, bound_flux_loc, bound_pressure_cell, bound_pressure_face = self._local_discr(
-            sub_g, loc_k, loc_bnd, eta=eta, inverter=inverter, apertures=apertures
+            sub_g, loc_k, loc_bnd, eta=eta, inverter=inverter, apertures=loc_apertures
         )
 
 
@@ -666,6 +711,60 @@ class Mpfa(FVElliptic):
      documented.
     """
 
+    def _merge_partial_discr(self, g, partial_results):
+        """
+        Merge discretizations computed on subgrids into global matrices.
+
+        Faces are assigned to the first partial discretization that covers them,
+        contributions from later discretizations on the same faces are discarded.
+        The matrices are assembled with a single conversion from coordinate
+        format.
+
+        Parameters:
+            g (pp.Grid): The global grid.
+            partial_results (iterable): Each item is the return value of
+                partial_discr(), that is, flux, bound_flux, bound_pressure_cell,
+                bound_pressure_face and active faces.
+
+        Returns:
+            sps.csr_matrix: flux, bound_flux, bound_pressure_cell and
+                bound_pressure_face, as returned by mpfa().
+
+        """
+        shapes = [
+            (g.num_faces, g.num_cells),
+            (g.num_faces, g.num_faces),
+            (g.num_faces, g.num_cells),
+            (g.num_faces, g.num_faces),
+        ]
+        rows = [[] for _ in shapes]
+        cols = [[] for _ in shapes]
+        vals = [[] for _ in shapes]
+
+        face_covered = np.zeros(g.num_faces, dtype=np.bool)
+
+        for loc_result in partial_results:
+            loc_faces = loc_result[-1]
+            for i, loc_mat in enumerate(loc_result[:-1]):
+                loc_mat = loc_mat.tocoo()
+                # Eliminate contribution from faces already covered
+                keep = np.logical_not(face_covered[loc_mat.row])
+                rows[i].append(loc_mat.row[keep])
+                cols[i].append(loc_mat.col[keep])
+                vals[i].append(loc_mat.data[keep])
+            face_covered[loc_faces] = 1
+
+        merged = []
+        for i, shape in enumerate(shapes):
+            mat = sps.coo_matrix(
+                (np.hstack(vals[i]), (np.hstack(rows[i]), np.hstack(cols[i]))),
+                shape=shape,
+            ).tocsr()
+            mat.eliminate_zeros()
+            merged.append(mat)
+
+        return merged
+
     def _estimate_peak_memory(self, g):
         """
         Rough estimate of peak memory need
@@ -952,4 +1051,21 @@ class Mpfa(FVElliptic):
         )
         rhs_bound = sps.vstack([neu_rob_cell, dir_cell]) * bnd_2_all_hf * hf_2_f
 
-        return rhs_bound
\ No newline at end of file
+        return rhs_bound
+
+
+def _partial_discr_worker(args):
+    """
+    Compute a partial MPFA discretization, see Mpfa.partial_discr().
+
+    Defined on module level so that it can be passed to a process pool.
+
+    Parameters:
+        args (tuple): keyword, grid, permeability, boundary condition, eta,
+            inverter, apertures and nodes defining the subgrid.
+
+    """
+    keyword, g, k, bnd, eta, inverter, apertures, nodes = args
+    return Mpfa(keyword).partial_discr(
+        g, k, bnd, eta=eta, inverter=inverter, nodes=nodes, apertures=apertures
+    )
@@ -151,5 +151,31 @@ class TestFvutils(unittest.TestCase):
         dis_true = flux * data["pressure"] + bound_flux * bc_val
         self.assertTrue(np.allclose(dis, dis_true))
 
+    def test_block_matrix_inverter_numba_mixed_block_sizes(self):
+        """
+        Invert a block matrix with blocks of varying size, in random order, and
+        with both int32 and int64 indices.
+        """
+        try:
+            import numba
+        except ImportError:
+            # Numba is not installed, nothing to test
+            return
+
+        np.random.seed(0)
+        sz = np.array([3, 1, 2, 3, 4, 2, 1, 4], dtype="i8")
+        blocks = [np.random.rand(n, n) + n * np.eye(n) for n in sz]
+        block = sps.block_diag(blocks, format="csr")
+        iblock_ex = np.linalg.inv(block.toarray())
+
+        iblock_numba = fvutils.invert_diagonal_blocks(block, sz, method="numba")
+        self.assertTrue(np.allclose(iblock_ex, iblock_numba.toarray()))
+
+        block.indices = block.indices.astype(np.int64)
+        block.indptr = block.indptr.astype(np.int64)
+        iblock_numba = fvutils.invert_diagonal_blocks(block, sz, method="numba")
+        self.assertTrue(np.allclose(iblock_ex, iblock_numba.toarray()))
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -123,6 +123,42 @@ class TestPartialMPFA(unittest.TestCase):
         self.assertTrue((bound_flux - bound_flux_full).min() > -1e-8)
 
 
+    def _setup_random_perm(self):
+        g = CartGrid([6, 5])
+        g.compute_geometry()
+
+        np.random.seed(42)
+        kxx = np.random.random(g.num_cells)
+        kyy = np.random.random(g.num_cells)
+        kxy = np.random.random(g.num_cells) * kxx * kyy
+        perm = PermTensor(2, kxx=kxx, kyy=kyy, kxy=kxy)
+
+        bound_faces = g.get_all_boundary_faces()
+        bnd = bc.BoundaryCondition(g, bound_faces[:5], ["dir"] * 5)
+        return g, perm, bnd
+
+    def _compare_to_full(self, g, perm, bnd, **kwargs):
+        full = pp.Mpfa("flow").mpfa(g, perm, bnd, inverter="python")
+        split = pp.Mpfa("flow").mpfa(g, perm, bnd, inverter="python", **kwargs)
+        for mat_full, mat_split in zip(full, split):
+            self.assertTrue(np.allclose(mat_full.toarray(), mat_split.toarray()))
+
+    def test_max_memory_split(self):
+        g, perm, bnd = self._setup_random_perm()
+        # Force a split into several partitions
+        peak_mem = pp.Mpfa("flow")._estimate_peak_memory(g)
+        self._compare_to_full(g, perm, bnd, max_memory=peak_mem / 4)
+
+    def test_process_parallel(self):
+        g, perm, bnd = self._setup_random_perm()
+        self._compare_to_full(g, perm, bnd, n_workers=2)
+
+    def test_process_parallel_max_memory(self):
+        g, perm, bnd = self._setup_random_perm()
+        peak_mem = pp.Mpfa("flow")._estimate_peak_memory(g)
+        self._compare_to_full(g, perm, bnd, n_workers=2, max_memory=peak_mem)
+
+
 class TestPartialMPSA(unittest.TestCase):
     def setup(self):
         g = CartGrid([5, 5])